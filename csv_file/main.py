@@ -1,11 +1,40 @@
 import argparse
+from array import array
 import csv
+import locale
+import marshal
+import mmap
+import operator
+import os
+import re
+import stat
+from itertools import chain, compress, count, repeat
 import sys
+from multiprocessing import Pool
 from tabulate import tabulate
-from typing import List, Dict, Union, Optional
+from typing import Callable, List, Dict, Iterable, Iterator, Union, Optional
 from pathlib import Path
 
 
+def average(values: Iterable[float]) -> float:
+    # zip pulls one number from the counter per value, so the sum and the
+    # count come out of a single pass without keeping the values around
+    counter = count()
+    total = sum(map(operator.itemgetter(0), zip(values, counter)))
+    return total / next(counter)
+
+
+TABULATE_MAX_ROWS = 10_000
+
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+
+AGGREGATES = {
+    "avg": average,
+    "min": min,
+    "max": max,
+}
+
+
 def parse_where_condition(condition: str) -> tuple[str, str, Union[str, float]]:
     operators = [">", "<", "="]
     for op in operators:
@@ -26,39 +55,88 @@ def parse_aggregate(aggregate: str) -> tuple[str, str]:
     if "=" not in aggregate:
         raise ValueError(f"Invalid aggregate format: {aggregate}")
     column, func = aggregate.split("=")
-    if func not in ["avg", "min", "max"]:
+    if func not in AGGREGATES:
         raise ValueError(f"Unsupported aggregate function: {func}")
     return column, func
 
 
+def _compile_predicate(
+        column: str, op: str, value: Union[str, float], argument: str, cell: str
+) -> Callable[..., bool]:
+    # the column name and operator are written into the source so the
+    # compiled function has no dict of operators or closure cells to go through
+    symbol = "==" if op == "=" else op
+    if isinstance(value, str):
+        body = f"return {cell}.strip() {symbol} value"
+    else:
+        # a text cell never equals a number, but cannot be ordered against one
+        message = f"Cannot compare non-numeric column: {column}"
+        handler = "return False" if op == "=" else f"raise ValueError({message!r}) from None"
+        body = (
+            f"try:\n"
+            f"        return float({cell}) {symbol} value\n"
+            f"    except ValueError:\n"
+            f"        {handler}"
+        )
+
+    namespace = {}
+    source = f"def predicate({argument}, value=value):\n    {body}\n"
+    exec(compile(source, "<predicate>", "exec"), {"value": value}, namespace)
+    return namespace["predicate"]
+
+
+def make_predicate(
+        column: str, op: str, value: Union[str, float]
+) -> Callable[[Dict[str, str]], bool]:
+    return _compile_predicate(column, op, value, "row", f"row[{column!r}]")
+
+
+def make_cell_predicate(
+        column: str, op: str, value: Union[str, float]
+) -> Callable[[str], bool]:
+    return _compile_predicate(column, op, value, "cell", "cell")
+
+
+def typed_column(values: Iterable[str]) -> array:
+    return array("d", map(float, values))
+
+
 def filter_data(
-        data: List[Dict[str, Union[str, float]]], condition: Optional[str]
-) -> List[Dict[str, Union[str, float]]]:
+        data: Iterable[Dict[str, Union[str, float]]], condition: Optional[str]
+) -> Iterable[Dict[str, Union[str, float]]]:
     if not condition:
         return data
 
-    column, op, value = parse_where_condition(condition)
+    return filter(make_predicate(*parse_where_condition(condition)), data)
 
-    filtered = []
-    for row in data:
-        row_value = row[column]
-        try:
-            row_value = float(row_value) if isinstance(row_value, str) and "." in row_value else int(row_value)
-        except (ValueError, TypeError):
-            pass
 
-        if op == ">" and row_value > value:
-            filtered.append(row)
-        elif op == "<" and row_value < value:
-            filtered.append(row)
-        elif op == "=":
-            if isinstance(value, str) and str(row_value) == value:
-                filtered.append(row)
-            elif not isinstance(value, str) and row_value == value:
-                filtered.append(row)
+def filter_columns(
+        columns: Dict[str, List[str]], condition: Optional[str]
+) -> Dict[str, List[Union[str, float]]]:
+    if not condition:
+        return columns
+
+    column, op, value = parse_where_condition(condition)
+    mask = list(map(make_cell_predicate(column, op, value), columns[column]))
+    filtered = {name: list(compress(cells, mask)) for name, cells in columns.items()}
+    if not isinstance(value, str):
+        filtered[column] = typed_column(filtered[column])
     return filtered
 
 
+def reduce_values(
+        values: Iterable[Union[str, float]], column: str, func: str
+) -> List[Dict[str, float]]:
+    values = iter(values) if isinstance(values, array) else map(float, values)
+    try:
+        first = next(values, None)
+        if first is None:
+            return []
+        return [{func: AGGREGATES[func](chain((first,), values))}]
+    except (ValueError, TypeError):
+        raise ValueError(f"Cannot aggregate non-numeric column: {column}")
+
+
 def aggregate_data(
         data: List[Dict[str, Union[str, float]]], aggregate: Optional[str]
 ) -> List[Dict[str, float]]:
@@ -66,76 +144,258 @@ def aggregate_data(
         return []
 
     column, func = parse_aggregate(aggregate)
+    return reduce_values(map(operator.itemgetter(column), data), column, func)
 
-    values = []
-    for row in data:
-        try:
-            value = float(row[column])
-            values.append(value)
-        except (ValueError, TypeError):
-            raise ValueError(f"Cannot aggregate non-numeric column: {column}")
 
-    if not values:
+def aggregate_columns(
+        columns: Dict[str, List[Union[str, float]]], aggregate: Optional[str]
+) -> List[Dict[str, float]]:
+    if not aggregate:
         return []
 
-    result = {}
-    if func == "avg":
-        result["avg"] = sum(values) / len(values)
-    elif func == "min":
-        result["min"] = min(values)
-    elif func == "max":
-        result["max"] = max(values)
+    column, func = parse_aggregate(aggregate)
+    return reduce_values(columns[column], column, func)
+
+
+def prefilter_text(condition: Optional[str]) -> Optional[str]:
+    if not condition:
+        return None
+    _, op, value = parse_where_condition(condition)
+    if op == "=" and isinstance(value, str) and value and '"' not in value:
+        return value
+    return None
+
 
-    return [result]
+def _has_quotes(file) -> bool:
+    # pipes and other non-regular files cannot be mapped or scanned ahead, so
+    # they always go through the csv module
+    info = os.fstat(file.fileno())
+    if not stat.S_ISREG(info.st_mode):
+        return True
+    if info.st_size == 0:
+        return False
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return mapped.find(b'"') != -1
 
 
-def read_csv(file_path: str) -> List[Dict[str, Union[str, float]]]:
+def _split_rows(
+        lines: Iterable[str], quoted: bool, contains: Optional[str] = None
+) -> Iterable[List[str]]:
+    # without any quotes every comma separates fields and every newline ends
+    # a row, so str.split can do the work of the csv state machine
+    if quoted:
+        return csv.reader(lines)
+    # each line is then a whole row, and a row can only match a string
+    # equality if its line contains the literal; with quotes a field may span
+    # lines, so dropping raw lines there would corrupt the parse
+    if contains:
+        lines = (line for line in lines if contains in line)
+    return (line.split(",") for line in map(str.rstrip, lines, repeat("\r\n")) if line)
+
+
+def iter_csv(file_path: str, contains: Optional[str] = None) -> Iterator[Dict[str, str]]:
     path = Path(file_path)
     if not path.exists():
         raise FileNotFoundError(f"File not found: {file_path}")
+    return _iter_rows(path, contains)
+
+
+def _iter_rows(path: Path, contains: Optional[str]) -> Iterator[Dict[str, str]]:
+    with open(path, mode="r", newline="") as file:
+        header = [name.strip() for name in next(csv.reader(file), [])]
+        for row in _split_rows(file, _has_quotes(file), contains):
+            if row:
+                yield dict(zip(header, chain(row, repeat(""))))
+
+
+def referenced_columns(where: Optional[str], aggregate: Optional[str]) -> set[str]:
+    names = set()
+    if where:
+        names.add(parse_where_condition(where)[0])
+    if aggregate:
+        names.add(parse_aggregate(aggregate)[0])
+    return names
+
+
+def read_columns(
+        file_path: str,
+        cache: bool = False,
+        contains: Optional[str] = None,
+        names: Optional[set[str]] = None,
+) -> Dict[str, List[str]]:
+    path = Path(file_path)
+    if not path.exists():
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    # the cache records the size and mtime of the file it was built from and
+    # is only used while both still match exactly
+    cache = cache and not contains
+    cache_path = path.with_name(path.name + ".columns")
+    source = path.stat()
+    signature = (source.st_size, source.st_mtime_ns)
+    if cache and cache_path.exists():
+        try:
+            with open(cache_path, mode="rb") as file:
+                cached_signature, cached_columns = marshal.load(file)
+            if cached_signature == signature:
+                return cached_columns
+        except (EOFError, ValueError, TypeError):
+            pass
+
+    with open(path, mode="r", newline="") as file:
+        header = [name.strip() for name in next(csv.reader(file), [])]
+        if cache or names is None:
+            keep = list(range(len(header)))
+        else:
+            keep = [i for i, name in enumerate(header) if name in names]
+        cells = [[] for _ in keep]
+        appends = [column.append for column in cells]
+        for row in _split_rows(file, _has_quotes(file), contains):
+            if row:
+                size = len(row)
+                for append, i in zip(appends, keep):
+                    append(row[i] if i < size else "")
+
+    columns = dict(zip([header[i] for i in keep], cells))
+    if cache:
+        try:
+            with open(cache_path, mode="wb") as file:
+                marshal.dump((signature, columns), file)
+        except OSError:
+            pass
+    return columns
+
+
+def _can_read_parallel(path: Path, condition: Optional[str]) -> bool:
+    # handing every row back to the parent costs about as much to unpickle as
+    # parsing it serially, so workers only pay off when --where drops most
+    # rows; chunks are cut at "\n", which only matches the serial reader when
+    # no quoted field spans lines and no bare "\r" ends a line
+    if not condition or (os.cpu_count() or 1) < 2:
+        return False
+    if not path.is_file():
+        return False
+    size = path.stat().st_size
+    if size == 0 or size < PARALLEL_MIN_BYTES:
+        return False
+    with open(path, mode="rb") as file:
+        if _has_quotes(file):
+            return False
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return re.search(rb"\r(?!\n)", mapped) is None
+
+
+def _read_chunk(
+        file_path: str, start: int, end: int, header: List[str], condition: Optional[str]
+) -> List[Dict[str, str]]:
+    with open(file_path, mode="rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode(locale.getpreferredencoding(False))
+    # only "\n" ends a row; str.splitlines would also break on \x0c, \u2028 etc.
+    split = _split_rows(text.split("\n"), False, prefilter_text(condition))
+    rows = (dict(zip(header, chain(row, repeat("")))) for row in split if row)
+    return list(filter_data(rows, condition))
+
+
+def _read_csv_parallel(path: Path, condition: Optional[str]) -> List[Dict[str, str]]:
+    size = path.stat().st_size
+    workers = os.cpu_count() or 1
+    encoding = locale.getpreferredencoding(False)
+    with open(path, mode="rb") as file:
+        header = [name.strip() for name in next(csv.reader([file.readline().decode(encoding)]), [])]
+        bounds = [file.tell()]
+        for i in range(1, workers):
+            file.seek(max(size * i // workers, bounds[-1]))
+            file.readline()
+            bounds.append(file.tell())
+    bounds.append(size)
+
+    chunks = [
+        (str(path), start, end, header, condition)
+        for start, end in zip(bounds, bounds[1:])
+        if start < end
+    ]
+    with Pool(workers) as pool:
+        return list(chain.from_iterable(pool.starmap(_read_chunk, chunks)))
+
+
+def read_csv(file_path: str, condition: Optional[str] = None) -> List[Dict[str, Union[str, float]]]:
+    path = Path(file_path)
+    if _can_read_parallel(path, condition):
+        return _read_csv_parallel(path, condition)
+
+    return list(filter_data(iter_csv(file_path, prefilter_text(condition)), condition))
+
+
+def print_rows(data: List[Dict[str, Union[str, float]]]) -> None:
+    if len(data) <= TABULATE_MAX_ROWS:
+        print(tabulate(data, headers="keys", tablefmt="simple"))
+        return
+
+    # same columns as tabulate's headers="keys": every key, in first-seen order
+    fieldnames = list(dict.fromkeys(chain.from_iterable(data)))
+    writer = csv.DictWriter(sys.stdout, fieldnames=fieldnames, restval="", lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(data)
 
-    with open(path, mode="r") as file:
-        reader = csv.DictReader(file)
-        return [
-            {k.strip(): v.strip() if isinstance(v, str) else v
-             for k, v in row.items()}
-            for row in reader
-        ]
 
 def main():
     parser = argparse.ArgumentParser(description="Process CSV file with filtering and aggregation.")
     parser.add_argument("--file", required=True, help="Path to CSV file")
     parser.add_argument("--where", help="Filter condition, e.g. 'rating>4.7'")
     parser.add_argument("--aggregate", help="Aggregate function, e.g. 'rating=avg'")
+    parser.add_argument(
+        "--cache", action="store_true",
+        help="Keep parsed columns in <file>.columns to speed up repeated aggregate queries",
+    )
 
     args = parser.parse_args()
 
     try:
-        data = read_csv(args.file)
-    except FileNotFoundError as e:
-        print(f"Error: {e}", file=sys.stderr)
+        if args.where:
+            parse_where_condition(args.where)
+    except ValueError as e:
+        print(f"Error in filter condition: {e}", file=sys.stderr)
         sys.exit(1)
-    except Exception as e:
-        print(f"Error reading file: {e}", file=sys.stderr)
+
+    try:
+        if args.aggregate:
+            parse_aggregate(args.aggregate)
+    except ValueError as e:
+        print(f"Error in aggregation: {e}", file=sys.stderr)
         sys.exit(1)
 
     try:
-        filtered_data = filter_data(data, args.where)
+        if args.aggregate:
+            columns = read_columns(
+                args.file,
+                args.cache,
+                prefilter_text(args.where),
+                referenced_columns(args.where, args.aggregate),
+            )
+            data = filter_columns(columns, args.where)
+        else:
+            data = read_csv(args.file, args.where)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
     except ValueError as e:
         print(f"Error in filter condition: {e}", file=sys.stderr)
         sys.exit(1)
+    except Exception as e:
+        print(f"Error reading file: {e}", file=sys.stderr)
+        sys.exit(1)
 
     try:
         if args.aggregate:
-            result = aggregate_data(filtered_data if args.where else data, args.aggregate)
+            result = aggregate_columns(data, args.aggregate)
             if result:
                 print(tabulate(result, headers="keys", tablefmt="simple"))
             else:
                 print("No data to aggregate")
         else:
-            display_data = filtered_data if args.where else data
-            if display_data:
-                print(tabulate(display_data, headers="keys", tablefmt="simple"))
+            if data:
+                print_rows(data)
             else:
                 print("No data matches the filter condition")
     except ValueError as e:
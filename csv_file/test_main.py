@@ -1,12 +1,28 @@
 import pytest
+import main
+from array import array
 import csv
+import marshal
+import os
+import threading
 from pathlib import Path
 from main import (
     parse_where_condition,
     parse_aggregate,
     filter_data,
+    filter_columns,
+    make_predicate,
+    make_cell_predicate,
+    typed_column,
     aggregate_data,
+    aggregate_columns,
+    average,
     read_csv,
+    read_columns,
+    iter_csv,
+    referenced_columns,
+    prefilter_text,
+    print_rows,
 )
 
 
@@ -53,14 +69,63 @@ def test_parse_aggregate():
 
 
 
+def test_make_predicate(sample_data):
+    predicate = make_predicate("rating", ">", 4.7)
+    assert [predicate(row) for row in sample_data] == [True, True, False]
+
+    predicate = make_predicate("brand", "=", "apple")
+    assert [predicate(row) for row in sample_data] == [True, False, False]
+
+    predicate = make_predicate("price", "=", 999)
+    assert [predicate(row) for row in sample_data] == [True, False, False]
+
+    predicate = make_predicate("na'me", "<", "b")
+    assert predicate({"na'me": " a "})
+
+    with pytest.raises(ValueError):
+        make_predicate("brand", "<", 5)(sample_data[0])
+
+
+def test_numeric_equality_on_mixed_column():
+    rows = [
+        {"model": "15", "price": "999"},
+        {"model": "15 pro", "price": "1199"},
+        {"model": "14", "price": "799"},
+    ]
+    assert list(filter_data(rows, "model=15")) == rows[:1]
+    with pytest.raises(ValueError):
+        list(filter_data(rows, "model>14"))
+
+    columns = {name: [row[name] for row in rows] for name in rows[0]}
+    filtered = filter_columns(columns, "model=15")
+    assert filtered["price"] == ["999"]
+    assert aggregate_columns(filtered, "price=avg") == [{"avg": 999.0}]
+    with pytest.raises(ValueError):
+        filter_columns(columns, "model<14")
+
+
+def test_make_cell_predicate():
+    predicate = make_cell_predicate("rating", ">", 4.7)
+    assert list(map(predicate, ["4.9", " 4.8", "4.6"])) == [True, True, False]
+    assert make_cell_predicate("brand", "=", "apple")(" apple ")
+    with pytest.raises(ValueError):
+        make_cell_predicate("brand", "<", 5)("apple")
+
+
+def test_typed_column():
+    assert typed_column(["4.9", " 4.8", "4.6"]) == array("d", [4.9, 4.8, 4.6])
+    with pytest.raises(ValueError):
+        typed_column(["apple", " samsung "])
+
+
 def test_filter_data(sample_data):
     # Фильтр по числовому значению
-    filtered = filter_data(sample_data, "rating>4.7")
+    filtered = list(filter_data(sample_data, "rating>4.7"))
     assert len(filtered) == 2
     assert filtered[0]["name"] == "iphone 15 pro"
     assert filtered[1]["name"] == "galaxy s23 ultra"
 
-    filtered = filter_data(sample_data, "brand=apple")
+    filtered = list(filter_data(sample_data, "brand=apple"))
     assert len(filtered) == 1
     assert filtered[0]["name"] == "iphone 15 pro"
 
@@ -69,6 +134,12 @@ def test_filter_data(sample_data):
     with pytest.raises(ValueError):
         filter_data(sample_data, "invalid_filter")
 
+    with pytest.raises(ValueError):
+        list(filter_data(sample_data, "brand>5"))
+
+    rows = filter_data(iter(sample_data), "price<1000")
+    assert aggregate_data(rows, "price=max") == [{"max": 999.0}]
+
 
 def test_aggregate_data(sample_data):
     result = aggregate_data(sample_data, "rating=avg")
@@ -87,6 +158,34 @@ def test_aggregate_data(sample_data):
         aggregate_data(sample_data, "brand=avg")
 
 
+def test_average():
+    assert average([1.0, 2.0, 6.0]) == 3.0
+    assert average(iter([4.5])) == 4.5
+
+
+def test_aggregate_data_streaming(sample_data):
+    assert aggregate_data(iter(sample_data), "price=min") == [{"min": 199.0}]
+    assert aggregate_data([], "price=avg") == []
+
+
+def test_filter_and_aggregate_columns(sample_data):
+    columns = {name: [row[name] for row in sample_data] for name in sample_data[0]}
+
+    filtered = filter_columns(columns, "rating>4.7")
+    assert filtered["name"] == ["iphone 15 pro", "galaxy s23 ultra"]
+    assert filtered["rating"] == array("d", [4.9, 4.8])
+    assert aggregate_columns(filtered, "rating=min") == [{"min": 4.8}]
+    assert aggregate_columns(filtered, "price=max") == [{"max": 1199.0}]
+
+    filtered = filter_columns(columns, "brand=xiaomi")
+    assert filtered["price"] == ["199"]
+    assert aggregate_columns(filtered, "rating=avg") == [{"avg": 4.6}]
+
+    assert filter_columns(columns, None) is columns
+    with pytest.raises(ValueError):
+        aggregate_columns(columns, "brand=avg")
+
+
 def test_read_csv(temp_csv, sample_data):
     data = read_csv(str(temp_csv))
     assert len(data) == 3
@@ -96,6 +195,200 @@ def test_read_csv(temp_csv, sample_data):
         read_csv("nonexistent.csv")
 
 
+def test_iter_csv(temp_csv, sample_data):
+    rows = iter_csv(str(temp_csv))
+    assert next(rows) == sample_data[0]
+    assert list(rows) == sample_data[1:]
+
+    with pytest.raises(FileNotFoundError):
+        iter_csv("nonexistent.csv")
+
+
+def test_read_csv_parallel(tmp_path, sample_data, monkeypatch):
+    csv_file = tmp_path / "big.csv"
+    with open(csv_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["name", "brand", "price", "rating"])
+        writer.writeheader()
+        writer.writerows(sample_data * 50)
+
+    monkeypatch.setattr("main.PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr("os.cpu_count", lambda: 4)
+    calls = []
+    parallel = main._read_csv_parallel
+    monkeypatch.setattr("main._read_csv_parallel", lambda *a: calls.append(a) or parallel(*a))
+
+    assert read_csv(str(csv_file), "brand=apple") == sample_data[:1] * 50
+    assert read_csv(str(csv_file), "price>0") == sample_data * 50
+    assert len(calls) == 2
+
+    assert read_csv(str(csv_file)) == sample_data * 50
+    assert len(calls) == 2
+
+    csv_file.write_text("name,price\n" + "a\x0cb,5\nc\u2028d,7\n" * 20)
+    expected = [{"name": "a\x0cb", "price": "5"}, {"name": "c\u2028d", "price": "7"}] * 20
+    assert read_csv(str(csv_file), "price>0") == expected
+    assert len(calls) == 3
+
+    csv_file.write_text("name,price\n" + '"a, b",5\n' * 20)
+    assert read_csv(str(csv_file), "price>0") == [{"name": "a, b", "price": "5"}] * 20
+    assert len(calls) == 3
+
+    csv_file.write_bytes(b"name,price\r" + b"a,5\rb,7\r" * 20)
+    assert read_csv(str(csv_file), "price>0") == [{"name": "a", "price": "5"}, {"name": "b", "price": "7"}] * 20
+    assert len(calls) == 3
+
+    csv_file.write_bytes(b"name,price\r\n" + b"a,5\r\nb,7\r\n" * 20)
+    assert read_csv(str(csv_file), "price>0") == [{"name": "a", "price": "5"}, {"name": "b", "price": "7"}] * 20
+    assert len(calls) == 4
+
+
+def test_read_columns(temp_csv):
+    columns = read_columns(str(temp_csv))
+    assert list(columns) == ["name", "brand", "price", "rating"]
+    assert columns["price"] == ["999", "1199", "199"]
+
+    with pytest.raises(FileNotFoundError):
+        read_columns("nonexistent.csv")
+
+
+def test_read_columns_short_rows(tmp_path):
+    csv_file = tmp_path / "short.csv"
+    csv_file.write_text("name,brand,price\nipad,apple\npixel,google,599\n")
+    columns = read_columns(str(csv_file))
+    assert columns["price"] == ["", "599"]
+    assert filter_columns(columns, "brand=google")["price"] == ["599"]
+
+
+def test_read_columns_projection(temp_csv):
+    assert referenced_columns("brand=apple", "price=avg") == {"brand", "price"}
+    assert referenced_columns(None, "rating=max") == {"rating"}
+
+    columns = read_columns(str(temp_csv), names={"brand", "price"})
+    assert columns == {"brand": ["apple", "samsung", "xiaomi"], "price": ["999", "1199", "199"]}
+
+
+def test_read_columns_cache(temp_csv):
+    cache_path = Path(str(temp_csv) + ".columns")
+    columns = read_columns(str(temp_csv), cache=True)
+    assert cache_path.exists()
+
+    with open(cache_path, "rb") as f:
+        signature, cached = marshal.load(f)
+    assert cached == columns
+    with open(cache_path, "wb") as f:
+        marshal.dump((signature, {"price": ["1"]}), f)
+    assert read_columns(str(temp_csv), cache=True) == {"price": ["1"]}
+
+    stat = temp_csv.stat()
+    with open(temp_csv, "a", newline="") as f:
+        f.write("iphone 14,apple,799,4.7\n")
+    os.utime(temp_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+    assert read_columns(str(temp_csv), cache=True)["price"] == columns["price"] + ["799"]
+
+    with open(cache_path, "wb") as f:
+        f.write(b"not a cache")
+    assert read_columns(str(temp_csv), cache=True)["price"] == columns["price"] + ["799"]
+
+
+def test_prefilter_text(temp_csv, sample_data):
+    assert prefilter_text("brand=apple") == "apple"
+    assert prefilter_text("rating>4.7") is None
+    assert prefilter_text("price=999") is None
+    assert prefilter_text(None) is None
+
+    assert list(iter_csv(str(temp_csv), "apple")) == sample_data[:1]
+    assert read_columns(str(temp_csv), contains="xiaomi")["name"] == ["redmi note 12"]
+
+
+def test_read_csv_keeps_cells_unstripped(tmp_path):
+    csv_file = tmp_path / "spaced.csv"
+    csv_file.write_text("name , brand, price\nipad, apple , 599\n")
+
+    assert read_csv(str(csv_file)) == [{"name": "ipad", "brand": " apple ", "price": " 599"}]
+    assert len(read_csv(str(csv_file), "brand=apple")) == 1
+    assert len(read_csv(str(csv_file), "price>500")) == 1
+
+
+def test_read_csv_quoted_and_simple(tmp_path):
+    csv_file = tmp_path / "quoted.csv"
+    csv_file.write_text('name,brand\r\n"pixel, 8",google\r\n\r\nnothing,x\r\n')
+    assert read_csv(str(csv_file)) == [
+        {"name": "pixel, 8", "brand": "google"},
+        {"name": "nothing", "brand": "x"},
+    ]
+
+    csv_file.write_text("name,brand\r\npixel 8,google\r\n\r\nnothing,x\r\n")
+    assert read_csv(str(csv_file)) == [
+        {"name": "pixel 8", "brand": "google"},
+        {"name": "nothing", "brand": "x"},
+    ]
+    assert read_columns(str(csv_file))["brand"] == ["google", "x"]
+
+    csv_file.write_text("")
+    assert read_csv(str(csv_file)) == []
+
+
+def test_prefilter_skipped_for_multiline_fields(tmp_path):
+    csv_file = tmp_path / "multiline.csv"
+    csv_file.write_text('name,brand,price\n"note apple\nxx",samsung,5\niphone,apple,10\n')
+    assert read_csv(str(csv_file), "brand=apple") == [{"name": "iphone", "brand": "apple", "price": "10"}]
+    columns = read_columns(str(csv_file), contains=prefilter_text("brand=apple"))
+    assert aggregate_columns(filter_columns(columns, "brand=apple"), "price=avg") == [{"avg": 10.0}]
+
+    csv_file.write_text('name,brand,price\n"multi\nline apple",apple,10\n')
+    assert read_csv(str(csv_file), "brand=apple") == [
+        {"name": "multi\nline apple", "brand": "apple", "price": "10"}
+    ]
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="requires os.mkfifo")
+def test_read_csv_from_fifo(tmp_path):
+    fifo = tmp_path / "pipe.csv"
+    os.mkfifo(fifo)
+
+    def write():
+        with open(fifo, "w") as f:
+            f.write('name,brand,price\n"pixel, 8",google,5\n')
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    try:
+        assert read_csv(str(fifo)) == [{"name": "pixel, 8", "brand": "google", "price": "5"}]
+    finally:
+        writer.join(timeout=5)
+    assert not writer.is_alive()
+
+
+def test_read_csv_pads_short_rows(tmp_path):
+    csv_file = tmp_path / "short.csv"
+    csv_file.write_text("name,brand,price\nipad,apple\npixel,google,599\n")
+    rows = read_csv(str(csv_file))
+    assert rows[0] == {"name": "ipad", "brand": "apple", "price": ""}
+    assert list(filter_data(rows, "price=599")) == rows[1:]
+    assert read_csv(str(csv_file), "price=599") == [{"name": "pixel", "brand": "google", "price": "599"}]
+
+
+def test_read_csv_with_condition(temp_csv, sample_data):
+    assert read_csv(str(temp_csv), "rating>4.7") == sample_data[:2]
+    assert read_csv(str(temp_csv), "brand=xiaomi") == sample_data[2:]
+    assert read_csv(str(temp_csv), "price>5000") == []
+
+
+def test_print_rows(sample_data, capsys, monkeypatch):
+    print_rows(sample_data)
+    assert "-------" in capsys.readouterr().out
+
+    monkeypatch.setattr("main.TABULATE_MAX_ROWS", 2)
+    print_rows(sample_data)
+    output = capsys.readouterr().out
+    assert output.splitlines()[0] == "name,brand,price,rating"
+    assert "redmi note 12,xiaomi,199,4.6" in output
+
+    monkeypatch.setattr("main.TABULATE_MAX_ROWS", 0)
+    print_rows([{"name": "ipad", "brand": "apple"}, {"name": "pixel", "brand": "google", "price": "599"}])
+    assert capsys.readouterr().out.splitlines() == ["name,brand,price", "ipad,apple,", "pixel,google,599"]
+
+
 def test_integration(temp_csv):
     from main import main  # замените 'your_module' на имя вашего модуля
     import sys